@@ -12,28 +12,35 @@ Access at: http://<local-ip>:5000
 """
 
 import os
+import sys
+import hmac
+import atexit
+import signal
+import hashlib
+import shutil
 import logging
+import tempfile
+import threading
 from io import BytesIO
 from functools import wraps
-from datetime import datetime
+from itertools import chain
+from time import strftime
 
 from flask import (
     Flask, render_template, request, redirect, url_for,
     session, flash, send_file, abort, jsonify
 )
 from flask_wtf.csrf import CSRFProtect
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment
-from openpyxl.utils import get_column_letter
 
 import config
 from config import load_semester_session
 from database import (
-    init_db, validate_token, mark_token_used, save_feedback,
-    get_token_stats, get_all_feedback, get_feedback_by_teacher,
-    get_feedback_by_subject, get_teacher_summary, get_question_averages,
-    create_session, get_session_by_token, update_session_progress,
-    get_completed_combo_indices, get_session_stats
+    init_db, validate_token, save_feedback_and_progress,
+    get_token_stats, iter_all_feedback, iter_feedback_by_teacher,
+    iter_feedback_by_subject, get_teacher_summary, get_question_averages,
+    create_session, get_session_by_token,
+    get_completed_combo_indices, get_session_stats,
+    get_feedback_version
 )
 
 
@@ -49,6 +56,16 @@ app.config['WTF_CSRF_ENABLED'] = True
 # Enable CSRF protection
 csrf = CSRFProtect(app)
 
+# Form field / column names for the 10 rating questions
+_Q_KEYS = tuple(f'q{i}' for i in range(1, 11))
+
+# Excel export column headers
+_EXCEL_HEADERS = (
+    'Teacher', 'Subject', 'Semester', 'Session', 'Branch',
+    'Q1', 'Q2', 'Q3', 'Q4', 'Q5', 'Q6', 'Q7', 'Q8', 'Q9', 'Q10',
+    'Comment', 'Submitted At'
+)
+
 
 def admin_required(f):
     """Decorator to require admin authentication."""
@@ -60,6 +77,11 @@ def admin_required(f):
     return decorated_function
 
 
+def next_incomplete_index(completed, total: int) -> int:
+    """Get the first combo index not in completed, or total if all are done."""
+    return min(set(range(total)).difference(completed), default=total)
+
+
 def get_current_combos():
     """Get current teacher-subject combos (reload from config for live updates)."""
     return config.load_combos()
@@ -105,14 +127,11 @@ def verify_token():
         # Resume existing session
         session['valid_token'] = token
         session['session_id'] = existing_session['id']
-        session['total_combos'] = existing_session['total_combos']
         # Find next incomplete combo
         completed = get_completed_combo_indices(existing_session['id'])
-        next_index = 0
-        for i in range(len(combos)):
-            if i not in completed:
-                next_index = i
-                break
+        next_index = next_incomplete_index(completed, len(combos))
+        if next_index >= len(combos):
+            return redirect(url_for('thankyou'))
         return redirect(url_for('feedback_step', index=next_index))
     
     # Validate token exists and is unused
@@ -124,7 +143,6 @@ def verify_token():
     session_id = create_session(token, len(combos))
     session['valid_token'] = token
     session['session_id'] = session_id
-    session['total_combos'] = len(combos)
     
     return redirect(url_for('feedback_step', index=0))
 
@@ -146,9 +164,9 @@ def feedback_step(index):
     completed = get_completed_combo_indices(session['session_id'])
     if index in completed:
         # Find next incomplete or go to thank you
-        for i in range(len(combos)):
-            if i not in completed:
-                return redirect(url_for('feedback_step', index=i))
+        next_index = next_incomplete_index(completed, len(combos))
+        if next_index < len(combos):
+            return redirect(url_for('feedback_step', index=next_index))
         return redirect(url_for('thankyou'))
     
     current_combo = combos[index]
@@ -187,45 +205,37 @@ def submit_step(index):
     comment = request.form.get('comment', '').strip()
     
     # Collect ratings (q1 to q10)
-    ratings = []
-    for i in range(1, 11):
-        try:
-            rating = int(request.form.get(f'q{i}', 0))
-            if rating < 1 or rating > 10:
-                raise ValueError()
-            ratings.append(rating)
-        except (ValueError, TypeError):
-            flash(f'Please provide a valid rating (1-10) for all questions.', 'error')
-            return redirect(url_for('feedback_step', index=index))
-    
-    # Save feedback with semester/session/branch
+    form = request.form
+    raw_ratings = [form.get(key, '') for key in _Q_KEYS]
+    if not all(r.isdecimal() for r in raw_ratings):
+        flash('Please provide a valid rating (1-10) for all questions.', 'error')
+        return redirect(url_for('feedback_step', index=index))
+    ratings = [int(r) for r in raw_ratings]
+    if not all(1 <= r <= 10 for r in ratings):
+        flash('Please provide a valid rating (1-10) for all questions.', 'error')
+        return redirect(url_for('feedback_step', index=index))
+    
+    # Save feedback with semester/session/branch and update progress; the
+    # token is marked used in the same transaction once all combos are done
     semester_session = get_current_semester_session()
-    save_feedback(
-        session_id, index, teacher, subject, ratings, comment,
+    completed, is_complete = save_feedback_and_progress(
+        session_id, index, teacher, subject, ratings, comment, len(combos),
         semester=semester_session['semester'],
         academic_session=semester_session['session'],
-        branch=semester_session['branch']
+        branch=semester_session['branch'],
+        token=session['valid_token']
     )
     
-    # Update session progress
-    completed = get_completed_combo_indices(session_id)
-    completed_count = len(completed)
-    
-    if completed_count >= len(combos):
-        # All combos completed, mark token as used and session as complete
-        mark_token_used(session['valid_token'])
-        update_session_progress(session_id, completed_count, is_complete=True)
-        # Clear session
+    if is_complete:
+        # All combos completed, clear session
         session.pop('valid_token', None)
         session.pop('session_id', None)
-        session.pop('total_combos', None)
         return redirect(url_for('thankyou'))
     else:
-        update_session_progress(session_id, completed_count)
         # Find next incomplete combo
-        for i in range(len(combos)):
-            if i not in completed:
-                return redirect(url_for('feedback_step', index=i))
+        next_index = next_incomplete_index(completed, len(combos))
+        if next_index < len(combos):
+            return redirect(url_for('feedback_step', index=next_index))
     
     return redirect(url_for('thankyou'))
 
@@ -245,7 +255,8 @@ def admin_login():
     """Admin login page."""
     if request.method == 'POST':
         password = request.form.get('password', '')
-        if password == config.ADMIN_PASSWORD:
+        provided = hashlib.sha256(password.encode()).digest()
+        if hmac.compare_digest(provided, config.ADMIN_PASSWORD_HASH):
             session['admin_logged_in'] = True
             return redirect(url_for('admin_dashboard'))
         else:
@@ -262,19 +273,36 @@ def admin_logout():
     return redirect(url_for('admin_login'))
 
 
+# Dashboard aggregates stored as a (feedback version, data) pair
+_analytics_cache = {}
+
+
+def get_feedback_analytics():
+    """Get the teacher summary and question averages for the dashboard.
+    
+    Both aggregate over the whole feedback table, so they are reused until
+    the feedback version changes instead of being recomputed per page view.
+    """
+    version = get_feedback_version()
+    cached = _analytics_cache.get('analytics')
+    if cached and cached[0] == version:
+        return cached[1]
+    analytics = (get_teacher_summary(), get_question_averages())
+    _analytics_cache['analytics'] = (version, analytics)
+    return analytics
+
+
 @app.route('/admin')
 @admin_required
 def admin_dashboard():
     """Admin dashboard with statistics and analytics."""
     token_stats = get_token_stats()
     session_stats = get_session_stats()
-    teacher_summary = get_teacher_summary()
-    question_averages = get_question_averages()
+    teacher_summary, question_averages = get_feedback_analytics()
     combos = get_current_combos()
     
     # Get unique teachers and subjects from combos for export options
-    teachers = list(set(c['teacher'] for c in combos))
-    subjects = list(set(c['subject'] for c in combos))
+    teachers, subjects = config.load_combo_names()
     
     # Get current semester/session for display
     semester_session = get_current_semester_session()
@@ -286,8 +314,8 @@ def admin_dashboard():
         teacher_summary=teacher_summary,
         question_averages=question_averages,
         questions=config.QUESTIONS,
-        teachers=teachers,
-        subjects=subjects,
+        teachers=list(teachers),
+        subjects=list(subjects),
         combos=combos,
         semester=semester_session['semester'],
         session=semester_session['session'],
@@ -299,129 +327,281 @@ def admin_dashboard():
 # Excel Export Routes
 # =============================================================================
 
-def create_excel_workbook(feedback_data: list, title: str) -> BytesIO:
-    """Create an Excel workbook from feedback data."""
-    wb = Workbook()
-    ws = wb.active
-    ws.title = title[:31]  # Excel sheet name limit
-    
-    # Headers
-    headers = [
-        'Teacher', 'Subject', 'Semester', 'Session', 'Branch',
-        'Q1', 'Q2', 'Q3', 'Q4', 'Q5', 'Q6', 'Q7', 'Q8', 'Q9', 'Q10',
-        'Comment', 'Submitted At'
+def _feedback_row(entry: dict) -> list:
+    """Flatten a feedback entry into export column order."""
+    return [
+        entry['teacher'],
+        entry['subject'],
+        entry.get('semester', ''),
+        entry.get('academic_session', ''),
+        entry.get('branch', ''),
+        *(entry[key] for key in _Q_KEYS),
+        entry.get('comment', ''),
+        entry.get('submitted_at', ''),
     ]
+
+
+def _track_widths(max_widths: list, row: list):
+    """Widen max_widths in place to fit the values of a row."""
+    for i, value in enumerate(row):
+        length = len(str(value)) if value is not None else 0
+        if length > max_widths[i]:
+            max_widths[i] = length
+
+
+def create_excel_workbook(feedback_data: list, title: str, output=None):
+    """Create an Excel workbook from feedback data.
+    
+    Uses XlsxWriter in constant-memory mode when it is installed and falls
+    back to openpyxl's write-only mode otherwise. Both stream rows into the
+    XLSX archive instead of holding a Cell object per value.
+    
+    The workbook is written to output (a file path or binary file object);
+    a new BytesIO is used and returned rewound when output is None.
+    """
+    if output is None:
+        output = BytesIO()
+    try:
+        import xlsxwriter
+    except ImportError:
+        _create_workbook_openpyxl(feedback_data, title, _EXCEL_HEADERS, output)
+    else:
+        _create_workbook_xlsxwriter(xlsxwriter, feedback_data, title, _EXCEL_HEADERS, output)
+    if isinstance(output, BytesIO):
+        output.seek(0)
+    return output
+
+
+def _create_workbook_xlsxwriter(xlsxwriter, feedback_data: list, title: str, headers: tuple, output):
+    """Write the export with XlsxWriter, flushing each row as it is written."""
+    # Keep student text literal: no hyperlinks (long URLs would be dropped)
+    # and no formulas from comments starting with '='
+    wb = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'strings_to_urls': False,
+        'strings_to_formulas': False,
+    })
+    ws = wb.add_worksheet(title[:31])  # Excel sheet name limit
     
     # Write headers with bold font
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = Font(bold=True)
-        cell.alignment = Alignment(horizontal='center')
+    header_format = wb.add_format({'bold': True, 'align': 'center'})
+    ws.write_row(0, 0, headers, header_format)
     
-    # Write data
-    for row_idx, entry in enumerate(feedback_data, 2):
-        ws.cell(row=row_idx, column=1, value=entry['teacher'])
-        ws.cell(row=row_idx, column=2, value=entry['subject'])
-        ws.cell(row=row_idx, column=3, value=entry.get('semester', ''))
-        ws.cell(row=row_idx, column=4, value=entry.get('academic_session', ''))
-        ws.cell(row=row_idx, column=5, value=entry.get('branch', ''))
-        for q in range(1, 11):
-            ws.cell(row=row_idx, column=q + 5, value=entry[f'q{q}'])
-        ws.cell(row=row_idx, column=16, value=entry.get('comment', ''))
-        ws.cell(row=row_idx, column=17, value=entry.get('submitted_at', ''))
+    # Write data, tracking the widest value per column as we go
+    max_widths = [len(h) for h in headers]
+    for row_idx, entry in enumerate(feedback_data, 1):
+        row = _feedback_row(entry)
+        _track_widths(max_widths, row)
+        ws.write_row(row_idx, 0, row)
     
     # Auto-adjust column widths
-    for col in range(1, len(headers) + 1):
-        max_length = max(
-            len(str(ws.cell(row=row, column=col).value or ''))
-            for row in range(1, len(feedback_data) + 2)
-        )
-        ws.column_dimensions[get_column_letter(col)].width = min(max_length + 2, 50)
-    
-    # Save to BytesIO
-    output = BytesIO()
+    for col, width in enumerate(max_widths):
+        ws.set_column(col, col, min(width + 2, 50))
+    
+    wb.close()
+
+
+def _create_workbook_openpyxl(feedback_data: list, title: str, headers: tuple, output):
+    """Write the export with openpyxl's write-only worksheet."""
+    # Imported here so the student-facing routes never load openpyxl
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, Alignment
+    from openpyxl.utils import get_column_letter
+    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=title[:31])  # Excel sheet name limit
+    
+    # Build row values, tracking the widest value per column as we go
+    max_widths = [len(h) for h in headers]
+    rows = []
+    for entry in feedback_data:
+        row = _feedback_row(entry)
+        _track_widths(max_widths, row)
+        rows.append(row)
+    
+    # Auto-adjust column widths (write-only sheets emit column
+    # dimensions before the first row, so set them up front)
+    for col, width in enumerate(max_widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = min(width + 2, 50)
+    
+    # Write headers with bold font
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.font = Font(bold=True)
+        cell.alignment = Alignment(horizontal='center')
+        header_cells.append(cell)
+    ws.append(header_cells)
+    
+    # Write data. append() would store a string starting with '=' as a
+    # formula (and one like '#N/A' as an error), so those get a cell
+    # pinned to plain text, matching the XlsxWriter export
+    def literal(value):
+        if isinstance(value, str) and value[:1] in ('=', '#'):
+            cell = WriteOnlyCell(ws, value=value)
+            cell.data_type = 's'
+            return cell
+        return value
+    
+    for row in rows:
+        ws.append([literal(value) for value in row])
+    
     wb.save(output)
-    output.seek(0)
-    return output
+
+
+# Built exports keyed by (scope, name). Each entry holds the feedback
+# version it was generated from and the path of the XLSX file on disk, so
+# repeat downloads skip both the query and the workbook serialization until
+# new feedback lands, and the file is served by the OS rather than from a
+# Python buffer. The lock covers lookup, rebuild and replacement, since the
+# threaded server can run two exports at once.
+_export_cache = {}
+_export_dir = None
+_export_lock = threading.Lock()
+
+
+def _new_export_path() -> str:
+    """Reserve a new file in this process's temporary export directory."""
+    global _export_dir
+    if _export_dir is None:
+        _export_dir = tempfile.mkdtemp(prefix='feedback_exports_')
+        atexit.register(shutil.rmtree, _export_dir, ignore_errors=True)
+    fd, path = tempfile.mkstemp(suffix='.xlsx', dir=_export_dir)
+    os.close(fd)
+    return path
+
+
+def _remove_export(path: str):
+    """Delete an export file, ignoring one still held open (Windows)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def get_cached_export(scope: str, name: str, version: int, fetch_feedback, title: str):
+    """Open the XLSX file for an export, rebuilding only when feedback changed.
+
+    fetch_feedback returns an iterable of entries, which is consumed once
+    while the workbook is written. Returns None when there is no feedback
+    to export.
+    
+    The file is opened while the export lock is held, so a concurrent
+    rebuild removing the old file can't pull it out from under this request.
+    """
+    key = (scope, name)
+    with _export_lock:
+        cached = _export_cache.get(key)
+        if cached and cached[0] == version:
+            return open(cached[1], 'rb')
+        
+        feedback = iter(fetch_feedback())
+        first = next(feedback, None)
+        if first is None:
+            return None
+        
+        path = _new_export_path()
+        try:
+            create_excel_workbook(chain((first,), feedback), title, path)
+        except BaseException:
+            _remove_export(path)
+            raise
+        _export_cache[key] = (version, path)
+        if cached:
+            _remove_export(cached[1])
+        return open(path, 'rb')
+
+
+def send_export(export_file, version: int, filename: str):
+    """Send an open export file as an attachment tagged with the feedback version.
+    
+    The response is conditional, so a repeat download whose If-None-Match
+    matches the current version gets an empty 304 instead of the file.
+    The file is closed when the response is.
+    """
+    return send_file(
+        export_file,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=filename,
+        conditional=True,
+        etag=str(version)
+    )
 
 
 @app.route('/export/all')
 @admin_required
 def export_all():
     """Export all feedback as Excel."""
-    feedback = get_all_feedback()
-    if not feedback:
+    version = get_feedback_version()
+    export_file = get_cached_export('all', None, version, iter_all_feedback, 'All Feedback')
+    if export_file is None:
         flash('No feedback data to export.', 'error')
         return redirect(url_for('admin_dashboard'))
     
-    excel_file = create_excel_workbook(feedback, 'All Feedback')
-    filename = f'feedback_all_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    return send_file(
-        excel_file,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=filename
-    )
+    filename = f'feedback_all_{strftime("%Y%m%d_%H%M%S")}.xlsx'
+    return send_export(export_file, version, filename)
 
 
 @app.route('/export/teacher/<teacher_name>')
 @admin_required
 def export_teacher(teacher_name: str):
     """Export feedback for a specific teacher."""
-    feedback = get_feedback_by_teacher(teacher_name)
-    if not feedback:
+    version = get_feedback_version()
+    export_file = get_cached_export(
+        'teacher', teacher_name, version,
+        lambda: iter_feedback_by_teacher(teacher_name), teacher_name
+    )
+    if export_file is None:
         flash(f'No feedback data for {teacher_name}.', 'error')
         return redirect(url_for('admin_dashboard'))
     
-    excel_file = create_excel_workbook(feedback, teacher_name)
     safe_name = teacher_name.replace(' ', '_').replace('.', '')
-    filename = f'feedback_{safe_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    return send_file(
-        excel_file,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=filename
-    )
+    filename = f'feedback_{safe_name}_{strftime("%Y%m%d_%H%M%S")}.xlsx'
+    return send_export(export_file, version, filename)
 
 
 @app.route('/export/subject/<subject_name>')
 @admin_required
 def export_subject(subject_name: str):
     """Export feedback for a specific subject."""
-    feedback = get_feedback_by_subject(subject_name)
-    if not feedback:
+    version = get_feedback_version()
+    export_file = get_cached_export(
+        'subject', subject_name, version,
+        lambda: iter_feedback_by_subject(subject_name), subject_name
+    )
+    if export_file is None:
         flash(f'No feedback data for {subject_name}.', 'error')
         return redirect(url_for('admin_dashboard'))
     
-    excel_file = create_excel_workbook(feedback, subject_name)
     safe_name = subject_name.replace(' ', '_')
-    filename = f'feedback_{safe_name}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-    
-    return send_file(
-        excel_file,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        as_attachment=True,
-        download_name=filename
-    )
+    filename = f'feedback_{safe_name}_{strftime("%Y%m%d_%H%M%S")}.xlsx'
+    return send_export(export_file, version, filename)
 
 
 # =============================================================================
 # Main Entry Point
 # =============================================================================
 
+def _exit_on_signal(signum, frame):
+    """Exit normally so atexit cleanup runs when the control panel stops us."""
+    sys.exit(0)
+
+
 if __name__ == '__main__':
+    # The control panel stops the server with SIGTERM (CTRL_BREAK_EVENT on
+    # Windows), which would otherwise kill the process without running
+    # atexit: the export directory and database cleanup would be skipped
+    signal.signal(signal.SIGTERM, _exit_on_signal)
+    if hasattr(signal, 'SIGBREAK'):
+        signal.signal(signal.SIGBREAK, _exit_on_signal)
+    
     # Initialize database
     init_db()
     
     # Get local IP for display
-    import socket
-    hostname = socket.gethostname()
-    try:
-        local_ip = socket.gethostbyname(hostname)
-    except:
-        local_ip = '127.0.0.1'
+    local_ip = config.get_local_ip()
     
     combos = get_current_combos()
     
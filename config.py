@@ -4,7 +4,15 @@ Edit this file to customize teacher-subject combos and questions.
 """
 
 import os
-import json
+import stat
+import hashlib
+import tempfile
+
+try:
+    import orjson  # Optional: several times faster than the stdlib json
+except ImportError:
+    orjson = None
+    import json  # Only needed as the fallback
 
 # Flask secret key for session management (fixed for consistent sessions)
 # In production, set this via environment variable
@@ -13,16 +21,22 @@ SECRET_KEY = os.environ.get('SECRET_KEY', 'feedback-system-local-secret-key-2024
 # Admin password (can be set via environment variable)
 ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'admin123')
 
+# Digest of the admin password, compared in constant time at login
+ADMIN_PASSWORD_HASH = hashlib.sha256(ADMIN_PASSWORD.encode()).digest()
+
+# Directory holding this module, the config file and the database
+_HERE = os.path.dirname(__file__)
+
 # Configuration file path for dynamic updates from GUI
-CONFIG_FILE = os.path.join(os.path.dirname(__file__), 'system_config.json')
+CONFIG_FILE = os.path.join(_HERE, 'system_config.json')
 
 # Default Teacher-Subject Combos (Admin configurable)
 # Each combo represents one feedback the student must give
-DEFAULT_TEACHER_SUBJECT_COMBOS = [
+DEFAULT_TEACHER_SUBJECT_COMBOS = (
     {"teacher": "Dr. Sharma", "subject": "Mathematics"},
     {"teacher": "Prof. Gupta", "subject": "Physics"},
     {"teacher": "Dr. Patel", "subject": "Chemistry"},
-]
+)
 
 # Default semester and session values
 DEFAULT_SEMESTER = 1
@@ -32,64 +46,151 @@ DEFAULT_BRANCH = "CSE"
 # Available branches
 AVAILABLE_BRANCHES = ["CSE", "EEE", "ME", "CE", "B.Arch", "M.Tech"]
 
-def load_combos():
-    """Load teacher-subject combos from config file or use defaults."""
-    if os.path.exists(CONFIG_FILE):
+# Parsed config file cached by mtime, so repeated loads skip the
+# open/read/parse until the file actually changes. Entries are replaced as
+# whole tuples: 'config' -> (mtime_ns, parsed dict, raw bytes), plus values
+# derived from it such as 'combo_names'.
+_load_cache = {}
+
+
+def _loads(data: bytes):
+    """Parse JSON bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _dumps(config) -> bytes:
+    """Serialize config as indented JSON bytes, using orjson when installed."""
+    if orjson is not None:
+        return orjson.dumps(config, option=orjson.OPT_INDENT_2)
+    return json.dumps(config, indent=2).encode()
+
+
+def _read_config():
+    """Return the parsed config file, or an empty dict if missing or invalid."""
+    try:
+        mtime_ns = os.stat(CONFIG_FILE).st_mtime_ns
+    except OSError:
+        return {}
+    cached = _load_cache.get('config')
+    if cached and cached[0] == mtime_ns:
+        return cached[1]
+    try:
+        # Unbuffered: the whole file is read in one call, so a
+        # BufferedReader would only add an extra copy
+        with open(CONFIG_FILE, 'rb', buffering=0) as f:
+            # Key the cache on the file actually opened, in case it was
+            # replaced between the stat above and the open
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            data = f.read()
+        config = _loads(data)
+    except (ValueError, IOError):  # Both parsers raise ValueError subclasses
+        return {}
+    # Combos are shared by every caller, so hand them out as a tuple
+    if isinstance(config.get('teacher_subject_combos'), list):
+        config['teacher_subject_combos'] = tuple(config['teacher_subject_combos'])
+    _load_cache['config'] = (mtime_ns, config, data)
+    return config
+
+
+def _atomic_write(path: str, data: bytes) -> int:
+    """Replace path with data atomically and return the new file's mtime_ns.
+    
+    The data is written and fsynced to a temporary file in the same
+    directory, then renamed over path, so a crash mid-write leaves either
+    the old or the new file intact and never a truncated one. The
+    existing file's permissions are kept (mkstemp creates it as 0600),
+    so a server running as another user can still read it.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix='.cfg.', suffix='.tmp'
+    )
+    try:
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+        os.replace(tmp_path, path)
+    except BaseException:
         try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-                return config.get('teacher_subject_combos', DEFAULT_TEACHER_SUBJECT_COMBOS)
-        except (json.JSONDecodeError, IOError):
+            os.remove(tmp_path)
+        except OSError:
             pass
-    return DEFAULT_TEACHER_SUBJECT_COMBOS
+        raise
+    return mtime_ns
+
+
+def _write_config(**updates):
+    """Apply top-level updates to the cached config and write it in one go.
+    
+    The current config comes from the cache rather than being re-read, and
+    the written dict becomes the new cache entry. Updates replace values
+    instead of mutating them, so the previously cached dict is untouched.
+    Saves that would produce the bytes already on disk are skipped.
+    """
+    config = {**_read_config(), **updates}
+    data = _dumps(config)
+    cached = _load_cache.get('config')
+    if cached and cached[2] == data:
+        return
+    mtime_ns = _atomic_write(CONFIG_FILE, data)
+    _load_cache.clear()
+    _load_cache['config'] = (mtime_ns, config, data)
+
+
+def load_combos():
+    """Load teacher-subject combos from config file or use defaults."""
+    return _read_config().get('teacher_subject_combos', DEFAULT_TEACHER_SUBJECT_COMBOS)
+
+
+def load_combo_names():
+    """Get the distinct teachers and subjects across the current combos.
+    
+    Returns a (teachers, subjects) pair of frozensets, rebuilt only when
+    the combos themselves are reloaded.
+    """
+    combos = load_combos()
+    cached = _load_cache.get('combo_names')
+    if cached and cached[0] is combos:
+        return cached[1]
+    names = (
+        frozenset(c['teacher'] for c in combos),
+        frozenset(c['subject'] for c in combos)
+    )
+    _load_cache['combo_names'] = (combos, names)
+    return names
+
 
 def save_combos(combos):
     """Save teacher-subject combos to config file."""
-    config = {}
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-        except (json.JSONDecodeError, IOError):
-            pass
-    
-    config['teacher_subject_combos'] = combos
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+    _write_config(teacher_subject_combos=tuple(combos))
 
 
 def load_semester_session():
     """Load semester, session, and branch from config file or use defaults."""
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-                return {
-                    'semester': config.get('semester', DEFAULT_SEMESTER),
-                    'session': config.get('session', DEFAULT_SESSION),
-                    'branch': config.get('branch', DEFAULT_BRANCH)
-                }
-        except (json.JSONDecodeError, IOError):
-            pass
-    return {'semester': DEFAULT_SEMESTER, 'session': DEFAULT_SESSION, 'branch': DEFAULT_BRANCH}
+    config = _read_config()
+    return {
+        'semester': config.get('semester', DEFAULT_SEMESTER),
+        'session': config.get('session', DEFAULT_SESSION),
+        'branch': config.get('branch', DEFAULT_BRANCH)
+    }
 
 
 def save_semester_session(semester: int, session: str, branch: str = None):
     """Save semester, session, and branch to config file."""
-    config = {}
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-        except (json.JSONDecodeError, IOError):
-            pass
-    
-    config['semester'] = semester
-    config['session'] = session
+    updates = {'semester': semester, 'session': session}
     if branch:
-        config['branch'] = branch
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+        updates['branch'] = branch
+    _write_config(**updates)
 
 
 # =============================================================================
@@ -98,64 +199,34 @@ def save_semester_session(semester: int, session: str, branch: str = None):
 
 def load_templates():
     """Load all templates from config file."""
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-                return config.get('templates', {})
-        except (json.JSONDecodeError, IOError):
-            pass
-    return {}
+    return _read_config().get('templates', {})
 
 
 def get_template(name: str):
     """Get a specific template by name."""
-    templates = load_templates()
-    return templates.get(name)
+    return load_templates().get(name)
 
 
 def save_template(name: str, semester: int, session: str, branch: str, combos: list):
     """Save a new template with the given configuration."""
-    config = {}
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, 'r') as f:
-                config = json.load(f)
-        except (json.JSONDecodeError, IOError):
-            pass
-    
-    if 'templates' not in config:
-        config['templates'] = {}
-    
-    config['templates'][name] = {
+    templates = dict(load_templates())
+    templates[name] = {
         'semester': semester,
         'session': session,
         'branch': branch,
-        'teacher_subject_combos': combos
+        'teacher_subject_combos': list(combos)
     }
-    
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+    _write_config(templates=templates)
 
 
 def delete_template(name: str):
     """Delete a template by name."""
-    if not os.path.exists(CONFIG_FILE):
+    templates = dict(load_templates())
+    if name not in templates:
         return False
     
-    try:
-        with open(CONFIG_FILE, 'r') as f:
-            config = json.load(f)
-    except (json.JSONDecodeError, IOError):
-        return False
-    
-    if 'templates' not in config or name not in config['templates']:
-        return False
-    
-    del config['templates'][name]
-    
-    with open(CONFIG_FILE, 'w') as f:
-        json.dump(config, f, indent=2)
+    del templates[name]
+    _write_config(templates=templates)
     
     return True
 
@@ -166,21 +237,32 @@ def apply_template(name: str):
     if not template:
         return False
     
-    # Save the template values as current config
-    save_semester_session(
-        template['semester'],
-        template['session'],
-        template['branch']
-    )
-    save_combos(template['teacher_subject_combos'])
+    # Save the template values as current config (in a single write)
+    updates = {
+        'semester': template['semester'],
+        'session': template['session'],
+        'teacher_subject_combos': tuple(template['teacher_subject_combos'])
+    }
+    if template['branch']:
+        updates['branch'] = template['branch']
+    _write_config(**updates)
     
     return True
 
-# Dynamic property to get current combos
-TEACHER_SUBJECT_COMBOS = load_combos()
+
+def __getattr__(name):
+    """Resolve TEACHER_SUBJECT_COMBOS on access so it tracks the config file.
+    
+    Reading config.TEACHER_SUBJECT_COMBOS returns the cached combos, so it
+    costs no disk access at import and never goes stale after save_combos().
+    """
+    if name == 'TEACHER_SUBJECT_COMBOS':
+        return load_combos()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # Feedback questions (10 questions, each rated 1-10)
-QUESTIONS = [
+QUESTIONS = (
     "Clarity of explanation",
     "Subject knowledge",
     "Teaching pace",
@@ -191,7 +273,29 @@ QUESTIONS = [
     "Fairness in evaluation",
     "Availability outside class",
     "Overall effectiveness",
-]
+)
 
 # Database file path
-DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'feedback.db')
+DATABASE_PATH = os.path.join(_HERE, 'feedback.db')
+
+
+def get_local_ip() -> str:
+    """Get the LAN IP address to show students.
+    
+    Connecting a UDP socket only picks the outgoing route; no packet is
+    sent and no DNS lookup happens, so startup can't stall on a slow
+    resolver. Falls back to resolving the hostname if there is no route.
+    """
+    import socket
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.connect(('8.8.8.8', 80))
+        return probe.getsockname()[0]
+    except OSError:
+        pass
+    finally:
+        probe.close()
+    try:
+        return socket.gethostbyname(socket.gethostname())
+    except OSError:
+        return '127.0.0.1'
@@ -13,11 +13,8 @@ Run with: python control_panel.py
 
 import os
 import sys
-import json
-import socket
 import signal
-import random
-import string
+import queue
 import threading
 import subprocess
 import webbrowser
@@ -30,7 +27,33 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, PROJECT_ROOT)
 
 from database import init_db, add_tokens, get_token_stats, reset_database
-from config import CONFIG_FILE, load_combos, save_combos, DATABASE_PATH, load_semester_session, save_semester_session, AVAILABLE_BRANCHES, load_templates, save_template, delete_template, apply_template
+from generate_tokens import generate_unique_tokens
+from config import CONFIG_FILE, load_combos, save_combos, DATABASE_PATH, load_semester_session, save_semester_session, AVAILABLE_BRANCHES, load_templates, save_template, delete_template, apply_template, get_local_ip
+
+
+# Platform-specific server process handling, chosen once at import
+if os.name == 'nt':
+    # Windows: run the server in its own process group so CTRL_BREAK
+    # reaches it without also hitting the control panel
+    _SERVER_CREATIONFLAGS = subprocess.CREATE_NEW_PROCESS_GROUP
+    
+    def _request_server_stop(process):
+        process.send_signal(signal.CTRL_BREAK_EVENT)
+else:
+    # Unix
+    _SERVER_CREATIONFLAGS = 0
+    
+    def _request_server_stop(process):
+        process.terminate()
+
+# Semester choices offered in the academic period dropdown
+_SEMESTERS = ("1", "2", "3", "4", "5", "6", "7", "8")
+
+# Shared tk.Button options (see ControlPanel.create_button)
+_BUTTON_FONT = ('Segoe UI', 10)
+_BUTTON_FONT_BOLD = ('Segoe UI', 10, 'bold')
+_BUTTON_PAD = {'padx': 12, 'pady': 6}
+_BUTTON_PAD_LARGE = {'padx': 15, 'pady': 8}
 
 
 class ModernStyle:
@@ -56,6 +79,41 @@ class ModernStyle:
     
     # Borders
     BORDER = "#333333"
+    
+    # ttk style name -> configure() options
+    TTK_STYLES = {
+        # Frames
+        "Dark.TFrame": {"background": BG_DARK},
+        "Card.TFrame": {"background": BG_CARD},
+        
+        # Labels
+        "Dark.TLabel": {"background": BG_DARK, "foreground": TEXT_PRIMARY,
+                        "font": ('Segoe UI', 10)},
+        "Card.TLabel": {"background": BG_CARD, "foreground": TEXT_PRIMARY,
+                        "font": ('Segoe UI', 10)},
+        "Title.TLabel": {"background": BG_DARK, "foreground": ACCENT,
+                         "font": ('Segoe UI', 16, 'bold')},
+        "Section.TLabel": {"background": BG_CARD, "foreground": TEXT_PRIMARY,
+                           "font": ('Segoe UI', 12, 'bold')},
+        "Muted.TLabel": {"background": BG_CARD, "foreground": TEXT_MUTED,
+                         "font": ('Segoe UI', 9)},
+        
+        # Buttons
+        "Accent.TButton": {"background": ACCENT,
+                           "foreground": TEXT_PRIMARY,  # White text on Indigo
+                           "font": ('Segoe UI', 10, 'bold'), "padding": (15, 8)},
+        "Secondary.TButton": {"background": BG_INPUT, "foreground": TEXT_PRIMARY,
+                              "font": ('Segoe UI', 10), "padding": (12, 6)},
+        "Danger.TButton": {"background": ERROR, "foreground": TEXT_PRIMARY,
+                           "font": ('Segoe UI', 10), "padding": (12, 6)},
+        
+        # Entry and spinbox
+        "Dark.TEntry": {"fieldbackground": BG_INPUT, "foreground": TEXT_PRIMARY,
+                        "insertcolor": TEXT_PRIMARY, "borderwidth": 0,
+                        "relief": "flat"},
+        "Dark.TSpinbox": {"fieldbackground": BG_INPUT, "foreground": TEXT_PRIMARY,
+                          "arrowcolor": TEXT_PRIMARY},
+    }
 
 
 class ControlPanel:
@@ -73,9 +131,26 @@ class ControlPanel:
         self.server_process = None
         self.server_running = False
         
+        # Last state seen by auto-refresh, so unchanged ticks do no work
+        self._last_db_signature = None
+        
+        # Values currently shown, so unchanged updates skip the Tk calls
+        self._shown_stats = None
+        self._shown_running = None
+        self._shown_combos = None
+        
         # Initialize database
         init_db()
         
+        # Blocking database work runs on one background thread, in order,
+        # so the window never freezes on a slow disk. Results come back
+        # through a queue polled on the Tk thread; the worker never calls
+        # into Tk itself.
+        self._io_queue = queue.Queue()
+        self._result_queue = queue.Queue()
+        threading.Thread(target=self._io_worker, daemon=True).start()
+        self.root.after(50, self._drain_results)
+        
         # Create UI
         self.create_styles()
         self.create_ui()
@@ -96,71 +171,12 @@ class ControlPanel:
         style = ttk.Style()
         style.theme_use('clam')
         
-        # Configure frame style
-        style.configure("Dark.TFrame", background=ModernStyle.BG_DARK)
-        style.configure("Card.TFrame", background=ModernStyle.BG_CARD)
-        
-        # Configure label style
-        style.configure("Dark.TLabel", 
-                       background=ModernStyle.BG_DARK, 
-                       foreground=ModernStyle.TEXT_PRIMARY,
-                       font=('Segoe UI', 10))
-        
-        style.configure("Card.TLabel", 
-                       background=ModernStyle.BG_CARD, 
-                       foreground=ModernStyle.TEXT_PRIMARY,
-                       font=('Segoe UI', 10))
-        
-        style.configure("Title.TLabel",
-                       background=ModernStyle.BG_DARK,
-                       foreground=ModernStyle.ACCENT,
-                       font=('Segoe UI', 16, 'bold'))
-        
-        style.configure("Section.TLabel",
-                       background=ModernStyle.BG_CARD,
-                       foreground=ModernStyle.TEXT_PRIMARY,
-                       font=('Segoe UI', 12, 'bold'))
-        
-        style.configure("Muted.TLabel",
-                       background=ModernStyle.BG_CARD,
-                       foreground=ModernStyle.TEXT_MUTED,
-                       font=('Segoe UI', 9))
-        
-        # Configure button style
-        style.configure("Accent.TButton",
-                       background=ModernStyle.ACCENT,
-                       foreground=ModernStyle.TEXT_PRIMARY,  # White text on Indigo
-                       font=('Segoe UI', 10, 'bold'),
-                       padding=(15, 8))
+        # Each style is applied with a single configure call
+        for name, options in ModernStyle.TTK_STYLES.items():
+            style.configure(name, **options)
         
         style.map("Accent.TButton",
                  background=[('active', ModernStyle.ACCENT_HOVER)])
-        
-        style.configure("Secondary.TButton",
-                       background=ModernStyle.BG_INPUT,
-                       foreground=ModernStyle.TEXT_PRIMARY,
-                       font=('Segoe UI', 10),
-                       padding=(12, 6))
-        
-        style.configure("Danger.TButton",
-                       background=ModernStyle.ERROR,
-                       foreground=ModernStyle.TEXT_PRIMARY,
-                       font=('Segoe UI', 10),
-                       padding=(12, 6))
-        
-        # Configure entry style
-        style.configure("Dark.TEntry",
-                       fieldbackground=ModernStyle.BG_INPUT,
-                       foreground=ModernStyle.TEXT_PRIMARY,
-                       insertcolor=ModernStyle.TEXT_PRIMARY,
-                       borderwidth=0,
-                       relief="flat")
-        
-        # Configure spinbox style
-        style.configure("Dark.TSpinbox",
-                       fieldbackground=ModernStyle.BG_INPUT,
-                       foreground=ModernStyle.TEXT_PRIMARY,
-                       arrowcolor=ModernStyle.TEXT_PRIMARY)
     
     def create_ui(self):
         """Create the main UI layout."""
@@ -185,10 +201,12 @@ class ControlPanel:
         scrollbar.pack(side="right", fill="y")
         canvas.pack(side="left", fill="both", expand=True)
         
-        # Bind mousewheel
+        # Bind mousewheel (X11 reports the wheel as buttons 4 and 5)
         def _on_mousewheel(event):
-            canvas.yview_scroll(int(-1*(event.delta/120)), "units")
+            canvas.yview_scroll(-1 if event.delta > 0 else 1, "units")
         canvas.bind_all("<MouseWheel>", _on_mousewheel)
+        canvas.bind_all("<Button-4>", lambda e: canvas.yview_scroll(-1, "units"))
+        canvas.bind_all("<Button-5>", lambda e: canvas.yview_scroll(1, "units"))
         
         # Title
         title_frame = ttk.Frame(scrollable_frame, style="Dark.TFrame")
@@ -215,6 +233,15 @@ class ControlPanel:
         # === Database Section ===
         self.create_database_section(scrollable_frame)
     
+    def create_button(self, parent, text, command, bg, bold=False, large=False, **options):
+        """Create a flat, coloured button in the panel's style."""
+        return tk.Button(parent, text=text, command=command,
+                         bg=bg, fg="white",
+                         font=_BUTTON_FONT_BOLD if bold else _BUTTON_FONT,
+                         relief="flat", cursor="hand2",
+                         **(_BUTTON_PAD_LARGE if large else _BUTTON_PAD),
+                         **options)
+    
     def create_card(self, parent, title):
         """Create a card-style frame with title."""
         card = ttk.Frame(parent, style="Card.TFrame", padding=15)
@@ -245,7 +272,7 @@ class ControlPanel:
         url_frame = ttk.Frame(card, style="Card.TFrame")
         url_frame.pack(fill=tk.X, pady=(0, 10))
         
-        self.local_ip = self.get_local_ip()
+        self.local_ip = get_local_ip()
         
         ttk.Label(url_frame, text="Local URL:", style="Muted.TLabel").pack(side=tk.LEFT)
         self.url_label = ttk.Label(url_frame, text=f"http://{self.local_ip}:5000", 
@@ -256,33 +283,20 @@ class ControlPanel:
         btn_frame = ttk.Frame(card, style="Card.TFrame")
         btn_frame.pack(fill=tk.X, pady=(5, 0))
         
-        self.start_btn = tk.Button(btn_frame, text="▶ Start Server", 
-                                   command=self.start_server,
-                                   bg=ModernStyle.SUCCESS, fg="white",
-                                   font=('Segoe UI', 10, 'bold'),
-                                   relief="flat", padx=15, pady=8, cursor="hand2")
+        self.start_btn = self.create_button(btn_frame, "▶ Start Server", self.start_server,
+                                            ModernStyle.SUCCESS, bold=True, large=True)
         self.start_btn.pack(side=tk.LEFT, padx=(0, 10))
         
-        self.stop_btn = tk.Button(btn_frame, text="■ Stop Server",
-                                  command=self.stop_server,
-                                  bg=ModernStyle.ERROR, fg="white",
-                                  font=('Segoe UI', 10, 'bold'),
-                                  relief="flat", padx=15, pady=8, cursor="hand2",
-                                  state=tk.DISABLED)
+        self.stop_btn = self.create_button(btn_frame, "■ Stop Server", self.stop_server,
+                                           ModernStyle.ERROR, bold=True, large=True, state=tk.DISABLED)
         self.stop_btn.pack(side=tk.LEFT, padx=(0, 10))
         
-        open_btn = tk.Button(btn_frame, text="🌐 Open in Browser",
-                            command=self.open_browser,
-                            bg=ModernStyle.BG_INPUT, fg="white",
-                            font=('Segoe UI', 10),
-                            relief="flat", padx=15, pady=8, cursor="hand2")
+        open_btn = self.create_button(btn_frame, "🌐 Open in Browser", self.open_browser,
+                                      ModernStyle.BG_INPUT, large=True)
         open_btn.pack(side=tk.LEFT)
         
-        admin_btn = tk.Button(btn_frame, text="🔐 Admin Panel",
-                             command=self.open_admin,
-                             bg=ModernStyle.BG_INPUT, fg="white",
-                             font=('Segoe UI', 10),
-                             relief="flat", padx=15, pady=8, cursor="hand2")
+        admin_btn = self.create_button(btn_frame, "🔐 Admin Panel", self.open_admin,
+                                       ModernStyle.BG_INPUT, large=True)
         admin_btn.pack(side=tk.LEFT, padx=(10, 0))
     
     def create_academic_period_section(self, parent):
@@ -302,7 +316,7 @@ class ControlPanel:
         semester_dropdown = ttk.Combobox(
             sem_frame, 
             textvariable=self.semester_var,
-            values=["1", "2", "3", "4", "5", "6", "7", "8"],
+            values=_SEMESTERS,
             state="readonly",
             width=5
         )
@@ -353,11 +367,8 @@ class ControlPanel:
         btn_frame = ttk.Frame(card, style="Card.TFrame")
         btn_frame.pack(fill=tk.X)
         
-        save_btn = tk.Button(btn_frame, text="💾 Save Academic Period",
-                            command=self.save_academic_period,
-                            bg=ModernStyle.SUCCESS, fg="white",
-                            font=('Segoe UI', 10, 'bold'),
-                            relief="flat", padx=15, pady=8, cursor="hand2")
+        save_btn = self.create_button(btn_frame, "💾 Save Academic Period", self.save_academic_period,
+                                      ModernStyle.SUCCESS, bold=True, large=True)
         save_btn.pack(side=tk.LEFT)
     
     def create_template_section(self, parent):
@@ -384,18 +395,12 @@ class ControlPanel:
         action_frame = ttk.Frame(card, style="Card.TFrame")
         action_frame.pack(fill=tk.X, pady=(0, 15))
         
-        load_btn = tk.Button(action_frame, text="🔄 Load Template",
-                            command=self.load_template,
-                            bg=ModernStyle.ACCENT, fg="white",
-                            font=('Segoe UI', 10, 'bold'),
-                            relief="flat", padx=15, pady=8, cursor="hand2")
+        load_btn = self.create_button(action_frame, "🔄 Load Template", self.load_template,
+                                      ModernStyle.ACCENT, bold=True, large=True)
         load_btn.pack(side=tk.LEFT, padx=(0, 10))
         
-        delete_btn = tk.Button(action_frame, text="🗑 Delete",
-                              command=self.delete_template,
-                              bg=ModernStyle.ERROR, fg="white",
-                              font=('Segoe UI', 10),
-                              relief="flat", padx=12, pady=6, cursor="hand2")
+        delete_btn = self.create_button(action_frame, "🗑 Delete", self.delete_template,
+                                        ModernStyle.ERROR)
         delete_btn.pack(side=tk.LEFT)
         
         # Separator
@@ -426,11 +431,8 @@ class ControlPanel:
         save_btn_frame = ttk.Frame(card, style="Card.TFrame")
         save_btn_frame.pack(fill=tk.X)
         
-        save_template_btn = tk.Button(save_btn_frame, text="💾 Save Current as Template",
-                                     command=self.save_current_as_template,
-                                     bg=ModernStyle.SUCCESS, fg="white",
-                                     font=('Segoe UI', 10, 'bold'),
-                                     relief="flat", padx=15, pady=8, cursor="hand2")
+        save_template_btn = self.create_button(save_btn_frame, "💾 Save Current as Template", self.save_current_as_template,
+                                               ModernStyle.SUCCESS, bold=True, large=True)
         save_template_btn.pack(side=tk.LEFT)
     
     def create_combos_section(self, parent):
@@ -484,18 +486,12 @@ class ControlPanel:
         combo_btn_frame = ttk.Frame(card, style="Card.TFrame")
         combo_btn_frame.pack(fill=tk.X)
         
-        add_btn = tk.Button(combo_btn_frame, text="+ Add Combo",
-                           command=self.add_combo,
-                           bg=ModernStyle.SUCCESS, fg="white",
-                           font=('Segoe UI', 10),
-                           relief="flat", padx=12, pady=6, cursor="hand2")
+        add_btn = self.create_button(combo_btn_frame, "+ Add Combo", self.add_combo,
+                                     ModernStyle.SUCCESS)
         add_btn.pack(side=tk.LEFT, padx=(0, 10))
         
-        remove_btn = tk.Button(combo_btn_frame, text="🗑 Remove Selected",
-                              command=self.remove_combo,
-                              bg=ModernStyle.ERROR, fg="white",
-                              font=('Segoe UI', 10),
-                              relief="flat", padx=12, pady=6, cursor="hand2")
+        remove_btn = self.create_button(combo_btn_frame, "🗑 Remove Selected", self.remove_combo,
+                                        ModernStyle.ERROR)
         remove_btn.pack(side=tk.LEFT)
     
     def create_tokens_section(self, parent):
@@ -539,18 +535,12 @@ class ControlPanel:
         token_btn_frame = ttk.Frame(card, style="Card.TFrame")
         token_btn_frame.pack(fill=tk.X)
         
-        gen_btn = tk.Button(token_btn_frame, text="🎲 Generate Tokens",
-                           command=self.generate_tokens,
-                           bg=ModernStyle.ACCENT, fg="white",
-                           font=('Segoe UI', 10, 'bold'),
-                           relief="flat", padx=15, pady=8, cursor="hand2")
-        gen_btn.pack(side=tk.LEFT, padx=(0, 10))
-        
-        export_btn = tk.Button(token_btn_frame, text="📄 Export to File",
-                              command=self.export_tokens,
-                              bg=ModernStyle.BG_INPUT, fg="white",
-                              font=('Segoe UI', 10),
-                              relief="flat", padx=12, pady=6, cursor="hand2")
+        self.gen_btn = self.create_button(token_btn_frame, "🎲 Generate Tokens", self.generate_tokens,
+                                          ModernStyle.ACCENT, bold=True, large=True)
+        self.gen_btn.pack(side=tk.LEFT, padx=(0, 10))
+        
+        export_btn = self.create_button(token_btn_frame, "📄 Export to File", self.export_tokens,
+                                        ModernStyle.BG_INPUT)
         export_btn.pack(side=tk.LEFT)
     
     def create_database_section(self, parent):
@@ -568,42 +558,69 @@ class ControlPanel:
         btn_frame = ttk.Frame(card, style="Card.TFrame")
         btn_frame.pack(fill=tk.X)
         
-        refresh_btn = tk.Button(btn_frame, text="🔄 Refresh Stats",
-                               command=self.refresh_all,
-                               bg=ModernStyle.BG_INPUT, fg="white",
-                               font=('Segoe UI', 10),
-                               relief="flat", padx=12, pady=6, cursor="hand2")
+        refresh_btn = self.create_button(btn_frame, "🔄 Refresh Stats", self.refresh_all,
+                                         ModernStyle.BG_INPUT)
         refresh_btn.pack(side=tk.LEFT, padx=(0, 10))
         
-        reset_btn = tk.Button(btn_frame, text="🗑 Reset Database",
-                             command=self.reset_db,
-                             bg=ModernStyle.ERROR, fg="white",
-                             font=('Segoe UI', 10),
-                             relief="flat", padx=12, pady=6, cursor="hand2")
+        reset_btn = self.create_button(btn_frame, "🗑 Reset Database", self.reset_db,
+                                       ModernStyle.ERROR)
         reset_btn.pack(side=tk.LEFT)
     
     # === Helper Methods ===
     
-    def get_local_ip(self):
-        """Get local IP address."""
+    def run_in_background(self, work, callback=None, on_error=None):
+        """Queue work for the I/O thread.
+        
+        callback(result) or on_error(exception) is then run on the Tk
+        thread; errors are ignored when no on_error is given.
+        """
+        self._io_queue.put((work, callback, on_error))
+    
+    def _io_worker(self):
+        """Run queued work items one at a time, forever."""
+        while True:
+            work, callback, on_error = self._io_queue.get()
+            try:
+                result = work()
+            except Exception as e:
+                handler, arg = on_error, e
+            else:
+                handler, arg = callback, result
+            if handler is not None:
+                self._result_queue.put((handler, arg))
+    
+    def _drain_results(self):
+        """Run callbacks for finished work on the Tk thread, then poll again."""
         try:
-            hostname = socket.gethostname()
-            return socket.gethostbyname(hostname)
-        except:
-            return "127.0.0.1"
+            while True:
+                try:
+                    handler, arg = self._result_queue.get_nowait()
+                except queue.Empty:
+                    break
+                handler(arg)
+        finally:
+            try:
+                self.root.after(50, self._drain_results)
+            except tk.TclError:
+                pass  # Window destroyed; stop polling
     
     def update_server_status(self):
         """Update server status indicator."""
+        running = False
         if self.server_running and self.server_process:
             if self.server_process.poll() is None:
-                self.status_label.config(text="● Running", foreground=ModernStyle.SUCCESS)
-                self.start_btn.config(state=tk.DISABLED)
-                self.stop_btn.config(state=tk.NORMAL)
+                running = True
             else:
                 self.server_running = False
-                self.status_label.config(text="● Stopped", foreground=ModernStyle.ERROR)
-                self.start_btn.config(state=tk.NORMAL)
-                self.stop_btn.config(state=tk.DISABLED)
+        
+        if running == self._shown_running:
+            return
+        self._shown_running = running
+        
+        if running:
+            self.status_label.config(text="● Running", foreground=ModernStyle.SUCCESS)
+            self.start_btn.config(state=tk.DISABLED)
+            self.stop_btn.config(state=tk.NORMAL)
         else:
             self.status_label.config(text="● Stopped", foreground=ModernStyle.ERROR)
             self.start_btn.config(state=tk.NORMAL)
@@ -620,9 +637,11 @@ class ControlPanel:
             self.server_process = subprocess.Popen(
                 [sys.executable, app_path],
                 cwd=PROJECT_ROOT,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                creationflags=subprocess.CREATE_NEW_PROCESS_GROUP if os.name == 'nt' else 0
+                # Nothing reads the server's output; an undrained pipe would
+                # eventually fill and block the server on its next log write
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                creationflags=_SERVER_CREATIONFLAGS
             )
             self.server_running = True
             self.update_server_status()
@@ -639,12 +658,7 @@ class ControlPanel:
             return
         
         try:
-            if os.name == 'nt':
-                # Windows
-                self.server_process.send_signal(signal.CTRL_BREAK_EVENT)
-            else:
-                # Unix
-                self.server_process.terminate()
+            _request_server_stop(self.server_process)
             
             self.server_process.wait(timeout=5)
             self.server_running = False
@@ -807,10 +821,17 @@ class ControlPanel:
     
     def refresh_combos(self):
         """Refresh combo list from config."""
-        self.combo_listbox.delete(0, tk.END)
         combos = load_combos()
-        for i, combo in enumerate(combos, 1):
-            self.combo_listbox.insert(tk.END, f"{i}. {combo['teacher']} — {combo['subject']}")
+        # The config cache hands back the same tuple until the file changes
+        if combos is self._shown_combos:
+            return
+        self._shown_combos = combos
+        
+        items = [f"{i}. {combo['teacher']} — {combo['subject']}" for i, combo in enumerate(combos, 1)]
+        self.combo_listbox.delete(0, tk.END)
+        # One Tcl call for all rows instead of one per combo
+        if items:
+            self.combo_listbox.insert(tk.END, *items)
     
     def add_combo(self):
         """Add a new teacher-subject combo."""
@@ -821,7 +842,7 @@ class ControlPanel:
             messagebox.showwarning("Input Required", "Please enter both teacher and subject.")
             return
         
-        combos = load_combos()
+        combos = list(load_combos())
         combos.append({"teacher": teacher, "subject": subject})
         save_combos(combos)
         
@@ -837,7 +858,7 @@ class ControlPanel:
             return
         
         idx = selection[0]
-        combos = load_combos()
+        combos = list(load_combos())
         
         if idx < len(combos):
             removed = combos.pop(idx)
@@ -846,8 +867,15 @@ class ControlPanel:
             messagebox.showinfo("Removed", f"Removed: {removed['teacher']} — {removed['subject']}")
     
     def update_token_stats(self):
-        """Update token statistics display."""
-        stats = get_token_stats()
+        """Update token statistics display (queried in the background)."""
+        self.run_in_background(get_token_stats, self.show_token_stats)
+    
+    def show_token_stats(self, stats):
+        """Show fetched token statistics."""
+        if stats == self._shown_stats:
+            return
+        self._shown_stats = stats
+        
         self.tokens_total_label.config(text=f"Total: {stats['total']}")
         self.tokens_used_label.config(text=f"Used: {stats['used']}")
         self.tokens_unused_label.config(text=f"Unused: {stats['unused']}")
@@ -862,26 +890,32 @@ class ControlPanel:
             messagebox.showerror("Invalid Input", "Please enter a number between 1 and 1000.")
             return
         
-        # Generate tokens
-        tokens = self.generate_unique_tokens(count)
-        added = add_tokens(tokens)
+        # Generate and insert on the I/O thread; the button stays disabled
+        # until then so a double click can't queue a second batch
+        self.gen_btn.config(state=tk.DISABLED)
         
-        self.update_token_stats()
-        self.last_generated_tokens = tokens
+        def work():
+            tokens = self.generate_unique_tokens(count)
+            return tokens, add_tokens(tokens)
+        
+        def on_added(result):
+            tokens, added = result
+            self.gen_btn.config(state=tk.NORMAL)
+            self.update_token_stats()
+            self.last_generated_tokens = tokens
+            
+            messagebox.showinfo("Tokens Generated", 
+                              f"Generated {len(tokens)} tokens.\n{added} new tokens added to database.")
+        
+        def on_error(error):
+            self.gen_btn.config(state=tk.NORMAL)
+            self.show_db_error(error)
         
-        messagebox.showinfo("Tokens Generated", 
-                          f"Generated {len(tokens)} tokens.\n{added} new tokens added to database.")
+        self.run_in_background(work, on_added, on_error)
     
     def generate_unique_tokens(self, count, length=6):
         """Generate unique random tokens."""
-        chars = string.ascii_uppercase + string.digits
-        chars = chars.replace('0', '').replace('O', '').replace('I', '').replace('1', '').replace('L', '')
-        
-        tokens = set()
-        while len(tokens) < count:
-            token = ''.join(random.choices(chars, k=length))
-            tokens.add(token)
-        return list(tokens)
+        return generate_unique_tokens(count, length)
     
     def export_tokens(self):
         """Export last generated tokens to file."""
@@ -896,9 +930,9 @@ class ControlPanel:
         )
         
         if filepath:
+            # Build the whole file in memory and write it in one call
             with open(filepath, 'w') as f:
-                for token in self.last_generated_tokens:
-                    f.write(token + '\n')
+                f.write('\n'.join(self.last_generated_tokens) + '\n')
             messagebox.showinfo("Exported", f"Tokens exported to:\n{filepath}")
     
     def reset_db(self):
@@ -910,11 +944,18 @@ class ControlPanel:
         )
         
         if result:
-            reset_database()
-            self.update_token_stats()
-            if hasattr(self, 'last_generated_tokens'):
-                self.last_generated_tokens = []
-            messagebox.showinfo("Reset Complete", "Database has been reset.")
+            self.run_in_background(reset_database, self.on_reset_done, self.show_db_error)
+    
+    def on_reset_done(self, _result):
+        """Update the display once the database reset has finished."""
+        self.update_token_stats()
+        if hasattr(self, 'last_generated_tokens'):
+            self.last_generated_tokens = []
+        messagebox.showinfo("Reset Complete", "Database has been reset.")
+    
+    def show_db_error(self, error):
+        """Report a failed background database operation."""
+        messagebox.showerror("Error", f"Database operation failed:\n{str(error)}")
     
     def refresh_all(self):
         """Refresh all data displays."""
@@ -927,10 +968,33 @@ class ControlPanel:
         """Start periodic auto-refresh of stats."""
         self.auto_refresh()
     
+    def get_db_signature(self):
+        """Get a cheap fingerprint that changes whenever the database is written.
+        
+        With WAL, commits land in the -wal file and only reach the main
+        file at checkpoints, so both files are stat'ed.
+        """
+        signature = []
+        for path in (DATABASE_PATH, DATABASE_PATH + '-wal'):
+            try:
+                st = os.stat(path)
+                signature.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+    
     def auto_refresh(self):
-        """Auto-refresh token stats every 5 seconds."""
+        """Auto-refresh token stats every 5 seconds.
+        
+        The stats are only re-queried when the database files changed; the
+        server status is checked every tick and redraws only on a change.
+        """
         try:
-            self.update_token_stats()
+            db_signature = self.get_db_signature()
+            if db_signature != self._last_db_signature:
+                self._last_db_signature = db_signature
+                self.update_token_stats()
+            
             self.update_server_status()
         except:
             pass  # Ignore errors during auto-refresh
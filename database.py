@@ -3,6 +3,8 @@ Database operations for the Anonymous Feedback System.
 Uses SQLite for local-only storage.
 """
 
+import queue
+import atexit
 import sqlite3
 from contextlib import contextmanager
 from config import DATABASE_PATH
@@ -13,6 +15,13 @@ def init_db():
     with get_db() as conn:
         cursor = conn.cursor()
         
+        # Write-ahead logging lets readers proceed while feedback is being
+        # written (the mode is persistent, so setting it once here is enough)
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
+        # Create and migrate the schema atomically
+        cursor.execute('BEGIN IMMEDIATE')
+        
         # Create tokens table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS tokens (
@@ -60,42 +69,121 @@ def init_db():
             )
         ''')
         
-        # Migration: Add semester and academic_session columns if they don't exist
-        try:
-            cursor.execute('ALTER TABLE feedback ADD COLUMN semester INTEGER')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        try:
-            cursor.execute('ALTER TABLE feedback ADD COLUMN academic_session TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
-        try:
-            cursor.execute('ALTER TABLE feedback ADD COLUMN branch TEXT')
-        except sqlite3.OperationalError:
-            pass  # Column already exists
+        # Migration: Add semester, academic_session and branch columns if
+        # they don't exist (checked once instead of trying each ALTER)
+        cursor.execute('PRAGMA table_info(feedback)')
+        columns = {row['name'] for row in cursor.fetchall()}
+        for name, decl in (('semester', 'INTEGER'), ('academic_session', 'TEXT'), ('branch', 'TEXT')):
+            if name not in columns:
+                cursor.execute(f'ALTER TABLE feedback ADD COLUMN {name} {decl}')
+        
+        # Indexes for the per-teacher/per-subject exports, the dashboard's
+        # GROUP BY teacher, subject and the per-session progress lookups
+        # (feedback_sessions.token is already indexed by its UNIQUE constraint)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_teacher_subject ON feedback(teacher, subject)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_subject ON feedback(subject)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_feedback_session ON feedback(session_id, combo_index)')
+        
+        # Partial indexes holding only used tokens / completed sessions, so
+        # those counts are answered from the index alone
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_tokens_used ON tokens(is_used) WHERE is_used = 1')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_complete ON feedback_sessions(is_complete) WHERE is_complete = 1')
         
         conn.commit()
+        
+        # Refresh planner statistics for tables that changed since the last
+        # run. Doing it at startup covers servers that were killed before
+        # the atexit hook could run (0x10000 checks every table, not only
+        # those this connection has queried; older SQLite ignores that bit)
+        cursor.execute('PRAGMA optimize=0x10002')
+
+
+# Configured connections are kept in a small pool and reused across calls
+# and threads, so each query doesn't pay for a fresh connect and PRAGMA
+# setup (the threaded server runs every request on a new thread, so a
+# per-thread cache would never be reused). Connections returned while the
+# pool is full are closed, so at most _POOL_SIZE stay open while idle.
+_POOL_SIZE = 8
+_pool = queue.Queue(maxsize=_POOL_SIZE)
+
+
+def _connect():
+    """Open and configure a new database connection."""
+    # Room for every distinct query in this module, so none is re-prepared.
+    # A connection is used by one caller at a time, but by different
+    # threads over its life, so check_same_thread is off.
+    # Autocommit (isolation_level=None): reads and single-statement writes
+    # run without Python's implicit BEGIN/COMMIT, and multi-statement
+    # writers open their own transaction with BEGIN IMMEDIATE.
+    conn = sqlite3.connect(
+        DATABASE_PATH, cached_statements=256, check_same_thread=False,
+        isolation_level=None
+    )
+    conn.row_factory = sqlite3.Row
+    # Safe with WAL: a crash can only lose the last commits, never corrupt
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    # ~20 MB page cache and memory-mapped reads of up to 256 MB
+    conn.execute('PRAGMA cache_size=-20000')
+    conn.execute('PRAGMA mmap_size=268435456')
+    return conn
 
 
 @contextmanager
 def get_db():
-    """Context manager for database connections."""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+    """Context manager checking a database connection out of the pool.
+    
+    A transaction left open by an error is rolled back before the
+    connection goes back to the pool, so it is clean for the next caller.
+    """
+    try:
+        conn = _pool.get_nowait()
+    except queue.Empty:
+        conn = _connect()
     try:
         yield conn
+    except BaseException:
+        conn.rollback()
+        raise
     finally:
-        conn.close()
+        try:
+            _pool.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+@atexit.register
+def close_connections():
+    """Close the pooled connections (the last close checkpoints the WAL).
+    
+    PRAGMA optimize runs first so SQLite can refresh planner statistics
+    for tables whose contents changed noticeably during the run.
+    """
+    while True:
+        try:
+            conn = _pool.get_nowait()
+        except queue.Empty:
+            break
+        try:
+            conn.execute('PRAGMA optimize')
+            conn.close()
+        except sqlite3.Error:
+            pass
 
 
 # Token operations
 def add_tokens(tokens: list):
-    """Add multiple tokens to the database."""
+    """Add multiple tokens to the database in a single transaction."""
     with get_db() as conn:
         cursor = conn.cursor()
+        # Take the write lock up front so the batch can't fail halfway on a
+        # lock upgrade while the server is writing too
+        cursor.execute('BEGIN IMMEDIATE')
+        # Rows are streamed to one prepared statement; each row binds a
+        # single parameter, so no chunking is needed for the bind limit
         cursor.executemany(
             'INSERT OR IGNORE INTO tokens (token, is_used) VALUES (?, 0)',
-            [(t,) for t in tokens]
+            ((t,) for t in tokens)
         )
         conn.commit()
         return cursor.rowcount
@@ -113,27 +201,17 @@ def validate_token(token: str) -> bool:
         return row is not None and row['is_used'] == 0
 
 
-def mark_token_used(token: str) -> bool:
-    """Mark a token as used. Returns True if successful."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute(
-            'UPDATE tokens SET is_used = 1 WHERE token = ? AND is_used = 0',
-            (token,)
-        )
-        conn.commit()
-        return cursor.rowcount > 0
-
-
 def get_token_stats() -> dict:
     """Get token statistics for admin dashboard."""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) as total FROM tokens')
-        total = cursor.fetchone()['total']
-        
-        cursor.execute('SELECT COUNT(*) as used FROM tokens WHERE is_used = 1')
-        used = cursor.fetchone()['used']
+        # Both counts in one statement; each is answered from an index
+        cursor.execute('''
+            SELECT (SELECT COUNT(*) FROM tokens) as total,
+                   (SELECT COUNT(*) FROM tokens WHERE is_used = 1) as used
+        ''')
+        row = cursor.fetchone()
+        total, used = row['total'], row['used']
         
         return {
             'total': total,
@@ -166,69 +244,115 @@ def get_session_by_token(token: str) -> dict:
         return dict(row) if row else None
 
 
-def update_session_progress(session_id: int, completed: int, is_complete: bool = False):
-    """Update session progress."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE feedback_sessions 
-            SET completed_combos = ?, is_complete = ?
-            WHERE id = ?
-        ''', (completed, 1 if is_complete else 0, session_id))
-        conn.commit()
-
-
-def get_completed_combo_indices(session_id: int) -> list:
-    """Get list of already completed combo indices for a session."""
+def get_completed_combo_indices(session_id: int) -> set:
+    """Get the set of already completed combo indices for a session."""
     with get_db() as conn:
         cursor = conn.cursor()
+        cursor.row_factory = None  # Plain tuples; no Row per index
         cursor.execute('''
             SELECT combo_index FROM feedback WHERE session_id = ?
         ''', (session_id,))
-        return [row['combo_index'] for row in cursor.fetchall()]
+        return {index for (index,) in cursor}
 
 
 # Feedback operations
-def save_feedback(session_id: int, combo_index: int, teacher: str, subject: str, ratings: list, comment: str, semester: int = None, academic_session: str = None, branch: str = None):
-    """Save feedback to database."""
+def save_feedback_and_progress(session_id: int, combo_index: int, teacher: str, subject: str, ratings: list, comment: str, total_combos: int, semester: int = None, academic_session: str = None, branch: str = None, token: str = None) -> tuple:
+    """Save feedback and update session progress in a single transaction.
+    
+    If token is given and this submission completes the session, the token
+    is marked used in the same transaction, so the final step costs one
+    commit. Returns (completed_indices, is_complete) for the session.
+    """
     with get_db() as conn:
         cursor = conn.cursor()
+        # Take the write lock before reading the session's progress
+        cursor.execute('BEGIN IMMEDIATE')
         cursor.execute('''
             INSERT INTO feedback 
             (session_id, combo_index, teacher, subject, semester, academic_session, branch, q1, q2, q3, q4, q5, q6, q7, q8, q9, q10, comment)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (session_id, combo_index, teacher, subject, semester, academic_session, branch, *ratings, comment))
+        
+        cursor.row_factory = None  # Plain tuples; no Row per index
+        cursor.execute('''
+            SELECT combo_index FROM feedback WHERE session_id = ?
+        ''', (session_id,))
+        completed = {index for (index,) in cursor}
+        is_complete = len(completed) >= total_combos
+        
+        cursor.execute('''
+            UPDATE feedback_sessions 
+            SET completed_combos = ?, is_complete = ?
+            WHERE id = ?
+        ''', (len(completed), 1 if is_complete else 0, session_id))
+        
+        if is_complete and token is not None:
+            cursor.execute(
+                'UPDATE tokens SET is_used = 1 WHERE token = ? AND is_used = 0',
+                (token,)
+            )
         conn.commit()
+        return completed, is_complete
 
 
-def get_all_feedback() -> list:
-    """Get all feedback entries."""
+def iter_all_feedback():
+    """Yield all feedback entries one at a time, newest first."""
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT * FROM feedback ORDER BY submitted_at DESC
         ''')
-        return [dict(row) for row in cursor.fetchall()]
+        for row in cursor:
+            yield dict(row)
 
 
-def get_feedback_by_teacher(teacher: str) -> list:
-    """Get feedback for a specific teacher."""
+def iter_feedback_by_teacher(teacher: str):
+    """Yield feedback for a specific teacher one entry at a time."""
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT * FROM feedback WHERE teacher = ? ORDER BY submitted_at DESC
         ''', (teacher,))
-        return [dict(row) for row in cursor.fetchall()]
+        for row in cursor:
+            yield dict(row)
 
 
-def get_feedback_by_subject(subject: str) -> list:
-    """Get feedback for a specific subject."""
+def iter_feedback_by_subject(subject: str):
+    """Yield feedback for a specific subject one entry at a time."""
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
             SELECT * FROM feedback WHERE subject = ? ORDER BY submitted_at DESC
         ''', (subject,))
-        return [dict(row) for row in cursor.fetchall()]
+        for row in cursor:
+            yield dict(row)
+
+
+def get_all_feedback() -> list:
+    """Get all feedback entries."""
+    return list(iter_all_feedback())
+
+
+def get_feedback_by_teacher(teacher: str) -> list:
+    """Get feedback for a specific teacher."""
+    return list(iter_feedback_by_teacher(teacher))
+
+
+def get_feedback_by_subject(subject: str) -> list:
+    """Get feedback for a specific subject."""
+    return list(iter_feedback_by_subject(subject))
+
+
+def get_feedback_version() -> int:
+    """Get a version number for the feedback table (highest feedback id).
+
+    Feedback ids are AUTOINCREMENT, so the value only ever moves forward
+    when new feedback is saved and can be used as a cache key.
+    """
+    with get_db() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT COALESCE(MAX(id), 0) as version FROM feedback')
+        return cursor.fetchone()['version']
 
 
 def get_teacher_summary() -> list:
@@ -287,21 +411,26 @@ def reset_database():
     """Reset the database (delete all data except tokens table structure)."""
     with get_db() as conn:
         cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
         cursor.execute('DELETE FROM feedback')
         cursor.execute('DELETE FROM feedback_sessions')
         cursor.execute('DELETE FROM tokens')
         conn.commit()
+        # Drop the statistics gathered on the old data
+        cursor.execute('ANALYZE')
 
 
 def get_session_stats() -> dict:
     """Get session statistics for admin dashboard."""
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('SELECT COUNT(*) as total FROM feedback_sessions')
-        total = cursor.fetchone()['total']
-        
-        cursor.execute('SELECT COUNT(*) as complete FROM feedback_sessions WHERE is_complete = 1')
-        complete = cursor.fetchone()['complete']
+        # Both counts in one statement; each is answered from an index
+        cursor.execute('''
+            SELECT (SELECT COUNT(*) FROM feedback_sessions) as total,
+                   (SELECT COUNT(*) FROM feedback_sessions WHERE is_complete = 1) as complete
+        ''')
+        row = cursor.fetchone()
+        total, complete = row['total'], row['complete']
         
         return {
             'total_sessions': total,
@@ -10,26 +10,51 @@ Examples:
     python generate_tokens.py 100 --export tokens.txt  # Generate and export to file
 """
 
+import os
 import argparse
-import random
-import string
 from database import init_db, add_tokens
 
+# Uppercase letters and digits for readability, excluding similar-looking
+# characters (0, O, I, 1, L)
+_TOKEN_CHARS = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+
+# bytes.translate table mapping random bytes to token characters, built once.
+# Bytes past the largest multiple of len(_TOKEN_CHARS) are deleted so every
+# character stays equally likely.
+_TOKEN_USABLE = 256 - 256 % len(_TOKEN_CHARS)
+_TOKEN_TABLE = bytes(
+    ord(_TOKEN_CHARS[b % len(_TOKEN_CHARS)]) for b in range(_TOKEN_USABLE)
+).ljust(256, b'\0')
+_TOKEN_DROPPED = bytes(range(_TOKEN_USABLE, 256))
+
+
+def random_token_chars(n: int) -> str:
+    """Get n random token characters, drawn from os.urandom in bulk."""
+    chars = ''
+    while len(chars) < n:
+        need = n - len(chars)
+        # Over-draw slightly to cover the deleted bytes
+        data = os.urandom(need + need // 8 + 8).translate(_TOKEN_TABLE, _TOKEN_DROPPED)
+        chars += data.decode('ascii')
+    return chars[:n]
+
 
 def generate_token(length: int = 6) -> str:
     """Generate a random alphanumeric token."""
-    # Use uppercase letters and digits for readability
-    chars = string.ascii_uppercase + string.digits
-    # Exclude similar-looking characters (0, O, I, 1, L)
-    chars = chars.replace('0', '').replace('O', '').replace('I', '').replace('1', '').replace('L', '')
-    return ''.join(random.choices(chars, k=length))
+    return random_token_chars(length)
 
 
 def generate_unique_tokens(count: int, length: int = 6) -> list:
-    """Generate a list of unique tokens."""
-    tokens = set()
+    """Generate a list of unique tokens.
+    
+    Characters for all missing tokens are drawn in one batch and sliced
+    up, so the loop only repeats to replace the rare duplicates. A dict
+    dedupes while keeping tokens in the order they were generated.
+    """
+    tokens = {}
     while len(tokens) < count:
-        tokens.add(generate_token(length))
+        chars = random_token_chars((count - len(tokens)) * length)
+        tokens.update(dict.fromkeys(chars[i:i + length] for i in range(0, len(chars), length)))
     return list(tokens)
 
 
@@ -78,8 +103,7 @@ def main():
     # Export to file if requested
     if args.export:
         with open(args.export, 'w') as f:
-            for token in tokens:
-                f.write(token + '\n')
+            f.write('\n'.join(tokens) + '\n')
         print(f"\nTokens exported to: {args.export}")
     
     print(f"\nTotal: {len(tokens)} tokens generated")
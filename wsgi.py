@@ -0,0 +1,16 @@
+"""
+WSGI entry point for the Anonymous Feedback System.
+
+Use this with a production WSGI server instead of the Flask development
+server, e.g.:
+
+    gunicorn -w 4 -b 0.0.0.0:5000 wsgi:application     # Linux/macOS
+    waitress-serve --port=5000 wsgi:application         # Windows
+"""
+
+from app import app, init_db
+
+# The development entry point (python app.py) does this in __main__
+init_db()
+
+application = app